@@ -1,4 +1,18 @@
-from setuptools import setup
+import os
+from setuptools import Extension, setup
+
+# The C read loop in ujlaser/_lasercontrol_c.pyx is optional, lasercontrol.py falls back to pure Python without it.
+# optional=True makes build_ext warn and carry on when the C compile fails (e.g. no compiler installed).
+ext_modules = []
+if os.name == "posix":
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        pass
+    else:
+        ext_modules = cythonize([Extension("ujlaser._lasercontrol_c", ["ujlaser/_lasercontrol_c.pyx"])])
+        for ext in ext_modules:
+            ext.optional = True # cythonize() doesn't carry this over from the Extension it was given
 
 setup(
     name='ujlaser',
@@ -9,7 +23,9 @@ setup(
     author_email='tylersengia@gmail.com',
     license='CC0',
     packages=['ujlaser'],
+    ext_modules=ext_modules,
     install_requires=['pyserial>=3.0'],
+    extras_require={'async': ['pyserial-asyncio']},
     classifiers=['Programming Language :: Python :: 3',
                  'Programming Language :: Python :: 3.5'],
 )
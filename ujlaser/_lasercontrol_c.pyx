@@ -0,0 +1,123 @@
+# cython: language_level=3
+"""
+Optional C version of the POSIX read loop in Laser._read_response(), see lasercontrol.py.
+setup.py builds this when Cython is installed, lasercontrol falls back to the pure Python loop when it isn't available.
+"""
+import os
+
+from libc.errno cimport errno, EINTR
+from libc.stdlib cimport malloc, free
+from libc.string cimport memcmp, memcpy
+from posix.select cimport fd_set, FD_SETSIZE, FD_SET, FD_ZERO, select
+from posix.time cimport clock_gettime, timespec, timeval, CLOCK_MONOTONIC
+from posix.unistd cimport read
+
+cdef enum:
+    CHUNK = 256 # most bytes taken from the port per read()
+
+cdef double _now() noexcept nogil:
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+
+cdef Py_ssize_t _find(const char *data, Py_ssize_t length, const char *term, Py_ssize_t term_length) noexcept nogil:
+    cdef Py_ssize_t i
+    for i in range(length - term_length + 1):
+        if memcmp(data + i, term, term_length) == 0:
+            return i
+    return -1
+
+def read_frame(int fd, bytes pending, bytes terminator, timeout, Py_ssize_t max_length):
+    """
+    Reads a single response from fd, the GIL is released while waiting on the port.
+
+    Parameters
+    ----------
+    fd : int
+        File descriptor of the serial port
+    pending : bytes
+        Bytes that were already read ahead from fd
+    terminator : bytes
+        The response terminator
+    timeout : float
+        Seconds to wait for the terminator, None to wait forever
+    max_length : int
+        Gives up once the response is this long, even without the terminator
+
+    Returns
+    ----------
+    (frame, rest) : tuple
+        frame is the binary response including the terminator, or whatever arrived if it was cut short.
+        rest is anything read past the end of frame, which belongs to the next response.
+    """
+    cdef const char *term = terminator
+    cdef Py_ssize_t term_length = len(terminator)
+    cdef Py_ssize_t length = len(pending)
+    cdef Py_ssize_t capacity = length + max_length + CHUNK
+    cdef Py_ssize_t end = -1
+    cdef Py_ssize_t n
+    cdef bint forever = timeout is None
+    cdef double deadline = 0
+    cdef double remaining
+    cdef timeval tv
+    cdef fd_set fds
+    cdef int ready
+    cdef int err = 0
+    cdef char *data
+
+    if fd < 0 or fd >= FD_SETSIZE:
+        raise ValueError("file descriptor out of range for select()")
+    if not forever:
+        deadline = _now() + <double>timeout
+
+    data = <char *>malloc(capacity)
+    if data == NULL:
+        raise MemoryError()
+    try:
+        memcpy(data, <const char *>pending, length)
+        with nogil:
+            while True:
+                end = _find(data, length, term, term_length)
+                if end != -1:
+                    end += term_length
+                    break
+                if length >= max_length:
+                    end = max_length
+                    break
+
+                FD_ZERO(&fds)
+                FD_SET(fd, &fds)
+                if forever:
+                    ready = select(fd + 1, &fds, NULL, NULL, NULL)
+                else:
+                    remaining = deadline - _now()
+                    if remaining < 0:
+                        remaining = 0
+                    tv.tv_sec = <long>remaining
+                    tv.tv_usec = <long>((remaining - <long>remaining) * 1e6)
+                    ready = select(fd + 1, &fds, NULL, NULL, &tv)
+                if ready < 0:
+                    if errno == EINTR:
+                        continue
+                    err = errno
+                    break
+                if ready == 0: # timed out
+                    end = length
+                    break
+
+                n = read(fd, data + length, CHUNK)
+                if n < 0:
+                    if errno == EINTR:
+                        continue
+                    err = errno
+                    break
+                if n == 0: # the port went away
+                    end = length
+                    break
+                length += n
+
+        if err:
+            raise OSError(err, os.strerror(err))
+        return data[:end], data[end:length]
+    finally:
+        free(data)
@@ -1,9 +1,76 @@
+import asyncio
+import operator
+import os
+import select
 import serial
 import serial.tools.list_ports
 import time
 import threading as thread
 
-from ujlaser.repeatedtimer import RepeatedTimer
+try:
+    from ujlaser._lasercontrol_c import read_frame as _read_frame # optional, built by setup.py when Cython is installed
+except ImportError:
+    _read_frame = None
+
+try:
+    import serial_asyncio # optional, only needed for connect_async()
+except ImportError:
+    serial_asyncio = None
+
+def _decode(response):
+    return response.rstrip(b"\r\n").decode('ascii')
+
+# Queries that only need their response checked and parsed. A getter is generated on Laser for each of them.
+# (method name, command, parser, docstring summary, (return name, return type, return description))
+_QUERIES = (
+    ("get_fet_voltage", "FV?", float, "Checks the FET voltage of the laser",
+        ("fet_voltage", "float", "Returns the float value of the FET voltage")),
+    ("get_diode_current", "IM?", float, "Checks current to diode of the laser",
+        ("diode_current", "float", "Returns the float value of the diode current")),
+    ("get_laser_ID", "ID?", _decode, "This command requests to see what the laser's ID value is.",
+        ("ID", "str", "Returns a string containing the laser's ID information")),
+    ("get_latched_status", "LS?", _decode, "This command requests to see what the laser's latched status is.",
+        ("latched_status", "str", "Returns '0' when the remote interlock is in, and '64' when the remote interlock is out.")),
+    ("get_system_shot_count", "SC?", int, "This command requests to see what the laser's system shot count is.",
+        ("system_SC", "int", "Returns the system shot count since factory build.")),
+    ("get_pulse_mode", "PM?", int, "Retrieves the laser pulse mode.",
+        ("pulse_mode", "int", "0 = continuous, 1 = single shot, 2 = burst.")),
+    ("get_pulse_period", "PE?", float, "Retrieves the pulse period for firing.",
+        ("pulse_period", "float", "Time between pulses, in seconds.")),
+    ("get_diode_trigger", "DT?", int, "Retrieves the diode trigger mode.",
+        ("trigger", "int", "0 = Software/internal. 1 = Hardware/external trigger.")),
+    ("get_pulse_width", "DW?", float, "Retrieves the diode pulse width.",
+        ("pulse_width", "float", "Width of each pulse, in seconds.")),
+    ("get_burst_count", "BC?", int, "Retrieves the burst count of the laser.",
+        ("burst_count", "int", "Number of pulses fired in burst mode.")),
+    ("get_repetition_rate", "RR?", float, "Retrieves the repetition rate of the laser.",
+        ("repetition_rate", "float", "Pulses per second, in Hz.")),
+)
+
+def _as_int(value):
+    """operator.index(), so any integer type is accepted but floats and strings are not. bools are rejected as well."""
+    if isinstance(value, bool):
+        raise TypeError("expected an integer, got a bool")
+    return operator.index(value)
+
+def _as_float(value):
+    """float() for numbers only, strings and bools raise TypeError instead of being converted."""
+    if isinstance(value, (bool, str, bytes)):
+        raise TypeError("expected a number, got " + type(value).__name__)
+    return float(value)
+
+def _as_number(value):
+    """Like _as_float(), but integer types stay ints so they are sent to the laser as typed ("2", not "2.0")."""
+    try:
+        return _as_int(value)
+    except TypeError:
+        return _as_float(value)
+
+# Every error response from the laser starts with this, see Laser._ERROR_CODES
+_ERR_PREFIX = b"?"
+
+# Commands that take no free-form parameter and are sent often enough to keep their complete frame around
+_FIXED_COMMANDS = ("SS?", "EN?", "EN 0", "EN 1", "FL 0", "FL 1") + tuple(query[1] for query in _QUERIES)
 
 class LaserCommandError(Exception):
     pass
@@ -16,93 +83,70 @@ class KickerError(Exception):
 
 class LaserStatusResponse():
     """This class is used to manipulate the SS? command and turn it into useful variables"""
+    __slots__ = ('_flags',)
+
+    # Bits of the SS? response as listed in the user manual, each one is exposed as a read-only boolean property
+    _BITS = (
+        ('laser_enabled', 1),
+        ('laser_active', 2),
+        ('diode_external_trigger', 8),
+        ('external_interlock', 64),
+        ('resonator_over_temp', 128),
+        ('electrical_over_temp', 256),
+        ('power_failure', 512),
+        ('ready_to_enable', 1024),
+        ('ready_to_fire', 2048),
+        ('low_power_mode', 4096),
+        ('high_power_mode', 8192),
+    )
+
     def __init__(self, response):
         """Parses the response string into a new LaserStatusResponseObject"""
-
-        i = int(response) # slice off the \r at the end
-        self.laser_enabled = bool(i & 1)
-        self.laser_active = bool(i & 2)
-        self.diode_external_trigger = bool(i & 8)
-        self.external_interlock = bool(i & 64)
-        self.resonator_over_temp = bool(i & 128)
-        self.electrical_over_temp = bool(i & 256)
-        self.power_failure = bool(i & 512)
-        self.ready_to_enable = bool(i & 1024)
-        self.ready_to_fire = bool(i & 2048)
-        self.low_power_mode = bool(i & 4096)
-        self.high_power_mode = bool(i & 8192)
+        # int() ignores the \r\n at the end, but not NUL padding from the adapter
+        self._flags = int(response.rstrip(b"\x00" if isinstance(response, bytes) else "\x00"))
 
     def __int__(self):
         """Returns an integer representation of the laser status. Should be an ASCII number as shown in the user manual."""
-        i = 0
-        if self.laser_enabled:
-            i += 1
-        if self.laser_active:
-            i += 2
-        if self.diode_external_trigger:
-            i += 8
-        if self.external_interlock:
-            i += 64
-        if self.resonator_over_temp:
-            i += 128
-        if self.electrical_over_temp:
-            i += 256
-        if self.power_failure:
-            i += 512
-        if self.ready_to_enable:
-            i += 1024
-        if self.ready_to_fire:
-            i += 2048
-        if self.low_power_mode:
-            i += 4096
-        if self.high_power_mode:
-            i += 8192
-
-        return i
+        return self._flags
 
     def __str__(self):
         """Returns a status print out in human-readable format."""
-        s = "Laser is "
-        if self.laser_enabled:
-            s += "enabled\n"
-        else:
-            s += "disabled\n"
-
-        s += "External Interlock is: "
-        if self.external_interlock:
-            s += "DISCONNECTED\n"
-        else:
-            s += "CONNECTED\n"
-
-        s += "Ready to fire: " + str(self.ready_to_fire) + "\n"
-        s += "Ready to enable: " + str(self.ready_to_enable) + "\n"
+        lines = [
+            "Laser is enabled" if self.laser_enabled else "Laser is disabled",
+            "External Interlock is: " + ("DISCONNECTED" if self.external_interlock else "CONNECTED"),
+            "Ready to fire: " + str(self.ready_to_fire),
+            "Ready to enable: " + str(self.ready_to_enable),
+        ]
 
         if self.low_power_mode:
-            s +=  "Laser is in LOW power mode.\n"
+            lines.append("Laser is in LOW power mode.")
         elif self.high_power_mode:
-            s += "Laser is in HIGH power mode.\n"
+            lines.append("Laser is in HIGH power mode.")
         else:
-            s += "Laser is in MANUAL power mode.\n"
+            lines.append("Laser is in MANUAL power mode.")
 
-        if self.laser_active:
-            s += "Laser is ACTIVE.\n"
-        else:
-            s += "Laser is not active.\n"
-
-        errors = ""
-        if self.power_failure:
-            errors += "!!!POWER FAILURE              !!!\n"
-        if self.resonator_over_temp:
-            errors += "!!!RESONATOR OVER TEMPERATURE !!!\n"
-        if self.electrical_over_temp:
-            errors += "!!!ELECTRICAL OVER TEMPERATURE!!!\n"
-        
-        if len(errors) > 0:
-            s += "!!!---------------------------!!!\n"
-            s += "!!!       ERROR REPORT        !!!\n"
-            s += errors
-            s += "!!!===========================!!!\n"
-        return s
+        lines.append("Laser is ACTIVE." if self.laser_active else "Laser is not active.")
+
+        if self.power_failure or self.resonator_over_temp or self.electrical_over_temp:
+            lines.append("!!!---------------------------!!!")
+            lines.append("!!!       ERROR REPORT        !!!")
+            if self.power_failure:
+                lines.append("!!!POWER FAILURE              !!!")
+            if self.resonator_over_temp:
+                lines.append("!!!RESONATOR OVER TEMPERATURE !!!")
+            if self.electrical_over_temp:
+                lines.append("!!!ELECTRICAL OVER TEMPERATURE!!!")
+            lines.append("!!!===========================!!!")
+
+        lines.append("") # end with a newline like every other line
+        return "\n".join(lines)
+
+def _status_flag(mask):
+    return property(lambda self: bool(self._flags & mask))
+
+for _name, _mask in LaserStatusResponse._BITS:
+    setattr(LaserStatusResponse, _name, _status_flag(_mask))
+del _name, _mask
 
 class Laser:
     """This class is where all of our functions that interact with the laser reside."""
@@ -116,8 +160,36 @@ class Laser:
     SINGLE_SHOT = 1
     BURST = 2
 
+    # Every command is framed as: start character, device address, delimiter, command, and terminator
+    _CMD_START = b";"
+    _CMD_DELIMITER = b":"
+    _CMD_SUFFIX = b"\r"
+
+    # Every response from the laser ends with <CR><LF>. Responses are short, so a read that hits the length cap without
+    # finding the terminator gives up early instead of waiting out the whole timeout.
+    _RESPONSE_TERMINATOR = b"\r\n"
+    _MAX_RESPONSE_LENGTH = 256
+
+    # Error responses listed in the user manual
+    _ERROR_CODES = {
+        b'?1\r\n': "Command not recognized.",
+        b'?2\r\n': "Missing command keyword.",
+        b'?3\r\n': "Invalid command keyword.",
+        b'?4\r\n': "Missing Parameter",
+        b'?5\r\n': "Invalid Parameter",
+        b'?6\r\n': "Query only. Command needs a question mark.",
+        b'?7\r\n': "Invalid query. Command does not have a query function.",
+        b'?8\r\n': "Command unavailable in current system state.",
+    }
+
     def __init__(self, pulseMode = 0, pulsePeriod = 0, repRate = 1, burstCount = 10, pulseWidth = 10, diodeTrigger = 0):
         self._ser = None
+        self._write = None # self._ser.write and self._ser.read_until, bound once by _bind_serial() since every command uses them
+        self._read_until = None
+        self._reader = None # asyncio streams opened by connect_async(), independent of _ser
+        self._writer = None
+        self._async_lock = None
+        self._async_timeout = 1
         self.pulseMode = pulseMode # NOTE: Pulse mode 0 = continuous is actually implemented as 2 = burst mode in this code.
         self.pulsePeriod = pulsePeriod
         self.repRate = repRate          # NOTE: The default repitition rate for the laser is 1 Hz not 10 Hz (10 is out of bounds aswell)
@@ -126,14 +198,30 @@ class Laser:
         self.diodeTrigger = diodeTrigger
 
         self.emergencyStopActive = False
-        self._lock = thread.Lock() # this lock will be acquired every time the serial port is accessed.
+        self._lock = thread.RLock() # this lock will be acquired every time the serial port is accessed. Reentrant so its holder may issue further commands.
+        self._write_lock = thread.Lock() # only held for the duration of a single write, so emergency_stop() can get a frame out while a read is blocking
+        self._emergency_stop_timeout = 0.05 # seconds emergency_stop() waits for the serial line before writing directly
         self._device_address = "LA"
+        self._prefix = Laser._CMD_START + self._device_address.encode("ascii") + Laser._CMD_DELIMITER # encoded once
+        self._fixed_frames = {cmd: self._prefix + cmd.encode("ascii") + Laser._CMD_SUFFIX for cmd in _FIXED_COMMANDS}
+        self._fd = None # file descriptor of the serial port on POSIX, lets _read_response() skip pyserial's byte at a time reads
+        self._chunked_reads = False # read whatever pyserial has waiting instead of a byte at a time, used when there is no _fd
+        self._rx_buffer = bytearray() # bytes read ahead that belong to the next response
         self.connected = False
         self._fire_timer = 0
         self._kicker_interval = 1 # Run the kicker every second
-        self._kicker = RepeatedTimer(self._kicker_interval, self._kicker_callback, False, self)
-
-    def connect(self, port_number, baud_rate=115200, timeout=1, parity=None, refresh=False):
+        self._kicker_stop = thread.Event() # set to stop the kicker thread
+        self._cache = {} # query -> (time.monotonic() timestamp, value) for read-only queries, cleared by any other command
+        self._cache_generation = 0 # bumped by every _cache_clear(), so a reply that was in flight during a clear isn't cached
+        self._cache_lock = thread.Lock() # held by _cache_put() and _cache_clear(), emergency_stop() clears without _lock
+        self._ranges = {} # parameter -> (minimum, maximum) from the laser, see _get_range()
+        self._status_ttl = 0.1   # seconds a status/armed query stays fresh
+        self._sensor_ttl = 0.5   # seconds a temperature/voltage reading stays fresh, these cannot change much faster
+        self._kicker_thread = None # only started by fire() when it's needed
+        self._kicker_next = None # time.monotonic() the next poll() tick is due, None when poll() has nothing to do
+        self.use_kicker_thread = True # set to False to run the kicker from your own loop by calling poll() instead
+
+    def connect(self, port_number, baud_rate=115200, timeout=1, parity=None, refresh=False, low_latency=True):
         """
         Sets up connection between flight computer and laser
 
@@ -151,6 +239,11 @@ class Laser:
         refresh : bool
             Default set to False. This resets all class variables if set to true
 
+        low_latency : bool
+            Default set to True. Asks the serial driver to hand received bytes over immediately instead of batching them.
+            On Linux this sets the ASYNC_LOW_LATENCY flag (same as `setserial /dev/ttyUSBx low_latency`), which drops the
+            FTDI latency timer from 16 ms to 1 ms. Silently ignored on platforms or adapters that don't support it.
+
         """
         with self._lock:
             #if port_number not in serial.tools.list_ports.comports():
@@ -181,29 +274,162 @@ class Laser:
                 self._ser.parity = serial.PARITY_SPACE
             else:
                 raise ValueError("Error: parity must be None, \'none\', \'even\', \'odd\', \'mark\', \'space\'")
+
+            if low_latency:
+                try:
+                    self._ser.set_low_latency_mode(True)
+                except (AttributeError, NotImplementedError, ValueError, OSError):
+                    pass # Not supported by this platform or adapter, the port still works, just with more latency
+
+            try:
+                self._ser.set_buffer_size(rx_size=65536, tx_size=4096) # only available on Windows, where the default is 4 KB
+            except (AttributeError, ValueError, OSError, serial.SerialException):
+                pass
+
+            self._fd = None
+            self._rx_buffer.clear()
+            self._ranges.clear() # may be a different laser
+            if os.name == "posix":
+                try:
+                    fd = self._ser.fileno()
+                except (AttributeError, serial.SerialException, OSError, ValueError):
+                    fd = None
+                if isinstance(fd, int):
+                    self._fd = fd
+            self._chunked_reads = self._fd is None and isinstance(self._ser, serial.SerialBase)
+            self._bind_serial()
             
             self.connected = True            
             
         if refresh:
             self.refresh_parameters()
 
+    async def connect_async(self, port_number, baud_rate=115200, timeout=1):
+        """
+        Opens an asyncio connection to the laser for get_status_async() and get_status_burst(), so an event loop can keep
+        polling the status without blocking on every round-trip. Requires the optional pyserial-asyncio package.
+        This is separate from connect(), don't use both on the same port.
+
+        Parameters
+        ----------
+        port_number : str
+            The serial port the laser is on, e.g. '/dev/ttyUSB0' or 'COM3'
+
+        baud_rate : int
+            Bits per second on serial connection
+
+        timeout : float
+            Number of seconds to wait for the responses to a request before it fails.
+        """
+        if serial_asyncio is None:
+            raise ImportError("connect_async() requires the pyserial-asyncio package, install it with: pip install pyserial-asyncio")
+        self._reader, self._writer = await serial_asyncio.open_serial_connection(url=port_number, baudrate=baud_rate)
+        self._async_lock = asyncio.Lock() # made here, older Pythons bind it to the event loop that is current when it is created
+        self._async_timeout = timeout
+
+    def _close_async(self):
+        """Closes the connection opened by connect_async(), if there is one."""
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = None
+            self._writer = None
+
     def disconnect(self):
+        self._close_async()
         if not self.connected:
             return
         self._ser.close()
         self.connected = False
         self._ser = None
+        self._write = None
+        self._read_until = None
+        self._fd = None
+        self._chunked_reads = False
+        self._rx_buffer.clear()
+        self._cache_clear()
+        self._ranges.clear()
         
     def refresh_parameters(self):
         """
         Query the laser about it's current settings.
         """
-        self.pulseMode = self.get_pulse_mode()
-        self.pulsePeriod = self.get_pulse_period()
-        self.repRate = self.get_repetition_rate()
-        self.burstCount = self.get_burst_count()
-        self.pulseWidth = self.get_pulse_width()
-        self.diodeTrigger = self.get_diode_trigger()
+        responses = self._send_commands(["PM?", "PE?", "RR?", "BC?", "DW?", "DT?"])
+        for response in responses:
+            if not response or response.startswith(_ERR_PREFIX):
+                raise LaserCommandError(Laser.get_error_code_description(response))
+
+        pulse_mode, pulse_period, rep_rate, burst_count, pulse_width, diode_trigger = responses
+        self.pulseMode = int(pulse_mode)
+        self.pulsePeriod = float(pulse_period)
+        self.repRate = float(rep_rate)
+        self.burstCount = int(burst_count)
+        self.pulseWidth = float(pulse_width)
+        self.diodeTrigger = int(diode_trigger)
+
+    def _bind_serial(self):
+        """Looks up the serial port methods used for every command once, call again whenever _ser is replaced."""
+        self._write = self._ser.write
+        self._read_until = self._ser.read_until
+
+    def _frame(self, cmd):
+        """Returns the complete encoded frame for cmd, in order this is: prefix, address, delimiter, command, and terminator"""
+        frame = self._fixed_frames.get(cmd)
+        if frame is None:
+            frame = self._prefix + (cmd.encode("ascii") if isinstance(cmd, str) else cmd) + Laser._CMD_SUFFIX
+        return frame
+
+    def _discard_input(self):
+        """
+        Throws away anything still waiting to be read, such as a late reply to a command that timedout or the reply to an
+        emergency stop written directly. Otherwise it would be taken as the response to the next command. Must be called
+        with _lock held, right before writing.
+        """
+        self._rx_buffer.clear()
+        self._ser.reset_input_buffer()
+
+    def _read_response(self):
+        """
+        Reads a single response from the laser. Must be called with _lock held.
+
+        Returns
+        ----------
+        response : bytes
+            The binary response up to and including the terminator. May be cut short (or empty) if the read timedout.
+        """
+        if self._fd is None and not self._chunked_reads:
+            return self._read_until(Laser._RESPONSE_TERMINATOR, Laser._MAX_RESPONSE_LENGTH)
+
+        # pyserial's read_until() does a full read() for every single byte. Instead, wait until anything is available and
+        # read all of it at once. Anything past the terminator is kept for the next response.
+        buf = self._rx_buffer
+        if self._fd is not None and _read_frame is not None: # same loop in C, without the GIL
+            response, rest = _read_frame(self._fd, bytes(buf), Laser._RESPONSE_TERMINATOR, self._ser.timeout, Laser._MAX_RESPONSE_LENGTH)
+            buf[:] = rest
+            return response
+
+        deadline = None if self._ser.timeout is None else time.monotonic() + self._ser.timeout
+        while True:
+            end = buf.find(Laser._RESPONSE_TERMINATOR)
+            if end != -1:
+                end += len(Laser._RESPONSE_TERMINATOR)
+                break
+            if len(buf) >= Laser._MAX_RESPONSE_LENGTH:
+                end = Laser._MAX_RESPONSE_LENGTH
+                break
+            if self._fd is not None:
+                remaining = None if deadline is None else max(0, deadline - time.monotonic())
+                ready, _, _ = select.select([self._fd], [], [], remaining)
+                chunk = os.read(self._fd, Laser._MAX_RESPONSE_LENGTH) if ready else b""
+            else:
+                chunk = self._ser.read(self._ser.in_waiting or 1) # waits up to the port timeout for the first byte
+            if not chunk: # timed out, or the port went away
+                end = len(buf)
+                break
+            buf.extend(chunk)
+
+        response = bytes(buf[:end])
+        del buf[:end]
+        return response
 
     def _send_command(self, cmd):
         """
@@ -211,51 +437,175 @@ class Laser:
 
         Parameters
         ----------
-        cmd : string
-            This contains the ASCII of the command to be sent. Should not include the prefix, address, delimiter, or terminator
+        cmd : string or bytes
+            This contains the ASCII of the command to be sent. Should not include the prefix, address, delimiter, or terminator.
+            Already encoded bytes are sent as-is.
 
         Returns
         ----------
         response : bytes
-            The binary response received by the laser. Includes the '\r' terminator. May be None is the read timedout.
+            The binary response received by the laser. Includes the '\r\n' terminator. May be None is the read timedout.
         """
         if len(cmd) == 0:
             return
 
+        return self._raw_command(self._frame(cmd))
+
+    def _raw_command(self, frame):
+        """
+        Sends an already complete frame (see _frame()) to laser and returns its response, otherwise the same as _send_command()
+        """
         if not self.connected:
             raise ConnectionError("Not connected to a serial port. Please call connect() before issuing any commands!")
 
-        # Form the complete command string, in order this is: prefix, address, delimiter, command, and terminator
-        cmd_complete = ";" + self._device_address + ":" + cmd + "\r"
-
         with self._lock: # make sure we're the only ones on the serial line
-            self._ser.write(cmd_complete.encode("ascii")) # write the complete command to the serial device
-            time.sleep(0.01)
-            response = self._ser.read_until("\r") # laser returns with <CR> = \r Note that this may timeout and return None
+            if not frame.endswith(b"?\r"):
+                self._cache_clear() # anything other than a query may change what the laser reports
+            self._discard_input()
+            with self._write_lock:
+                self._write(frame) # write the complete command to the serial device
+            response = self._read_response() # returns as soon as the terminator arrives. Note that this may timeout and return None
 
         return response
 
-    def get_status(self):
+    def _send_commands(self, cmds):
+        """
+        Sends several commands to laser in a single write, then reads back one response per command
+
+        Parameters
+        ----------
+        cmds : list
+            The ASCII commands (string or bytes) to be sent, in order. Each should not include the prefix, address, delimiter, or terminator
+
+        Returns
+        ----------
+        responses : list
+            The binary responses received by the laser, in the same order as cmds. Each may be empty if the read timedout.
         """
-        Obtains the status of the laser
+        if not self.connected:
+            raise ConnectionError("Not connected to a serial port. Please call connect() before issuing any commands!")
+
+        # The laser accepts several complete frames back-to-back and answers each of them in order
+        frames = [self._frame(cmd) for cmd in cmds]
+
+        with self._lock: # make sure we're the only ones on the serial line
+            if not all(frame.endswith(b"?\r") for frame in frames):
+                self._cache_clear()
+            self._discard_input()
+            with self._write_lock:
+                self._write(b"".join(frames))
+            responses = [self._read_response() for _ in cmds]
+
+        return responses
+
+    def _cache_get(self, query, ttl):
+        """Returns the cached value for query if it is younger than ttl seconds, otherwise None."""
+        entry = self._cache.get(query)
+        if entry is not None and time.monotonic() - entry[0] < ttl:
+            return entry[1]
+        return None
+
+    def _cache_put(self, query, value, generation):
+        """
+        Caches value as the answer to query and returns it. generation is the _cache_generation read before the query was
+        sent, if the cache was cleared since then the value may already be outdated and is not cached.
+        """
+        with self._cache_lock:
+            if generation == self._cache_generation:
+                self._cache[query] = (time.monotonic(), value)
+        return value
+
+    def _cache_clear(self):
+        """Drops every cached answer, call whenever something may have changed what the laser reports."""
+        with self._cache_lock:
+            self._cache_generation += 1
+            self._cache.clear()
+
+    def get_status(self, force=False):
+        """
+        Obtains the status of the laser. Repeated calls within _status_ttl seconds reuse the last response.
+
+        Parameters
+        ----------
+        force : bool
+            Default set to False. Always query the laser if set to True, use this when the answer is safety-critical.
 
         Returns
         -------
         status : LaserStatusResponse object
                 Returns a LaserStatusResponse object created from the SS? command's response that is received.
         """
+        if not force:
+            status = self._cache_get('SS?', self._status_ttl)
+            if status is not None:
+                return status
+
+        generation = self._cache_generation
         response = self._send_command('SS?')
-        if not response or response[0] == b"?": # Check to see if we got an error instead. NOTE: This originally had len(response) < 5, but I don't see the purpose of this and it causes errors.
+        if not response or response.startswith(_ERR_PREFIX): # Check to see if we got an error instead. NOTE: This originally had len(response) < 5, but I don't see the purpose of this and it causes errors.
             raise LaserCommandError(Laser.get_error_code_description(response))
-        else:
-            response = str(response[:-1].decode('ascii'))
-            return LaserStatusResponse(response)
+        return self._cache_put('SS?', LaserStatusResponse(response), generation)
+
+    async def get_status_async(self):
+        """
+        Obtains the status of the laser over the connection opened by connect_async().
+
+        Returns
+        -------
+        status : LaserStatusResponse object
+                Returns a LaserStatusResponse object created from the SS? command's response that is received.
+        """
+        return (await self.get_status_burst(1))[0]
+
+    async def get_status_burst(self, n):
+        """
+        Queries the status of the laser n times over the connection opened by connect_async(). All n queries are written
+        at once before any response is awaited, so the round-trips overlap instead of adding up.
+
+        Parameters
+        ----------
+        n : int
+            The number of SS? queries to send
+
+        Returns
+        -------
+        statuses : list
+            A LaserStatusResponse object for each response, in the order they were received.
+
+        If the responses don't arrive within the timeout given to connect_async(), the connection is closed and a
+        LaserCommandError is raised. Call connect_async() again before continuing.
+        """
+        if self._writer is None:
+            raise ConnectionError("Not connected to a serial port. Please call connect_async() before awaiting any commands!")
+
+        async with self._async_lock: # keep other coroutines from taking our responses
+            self._writer.write(self._fixed_frames['SS?'] * n)
+            await self._writer.drain()
+            try:
+                responses = await asyncio.wait_for(self._read_responses_async(n), self._async_timeout)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                # Late or leftover responses would be read as the answers to the next burst, so this connection can't be
+                # trusted anymore. Close it, the caller has to connect_async() again.
+                self._close_async()
+                raise LaserCommandError(Laser.get_error_code_description(None)) from None
+
+        for response in responses:
+            if response.startswith(_ERR_PREFIX):
+                raise LaserCommandError(Laser.get_error_code_description(response))
+        return [LaserStatusResponse(response) for response in responses]
+
+    async def _read_responses_async(self, n):
+        """Reads n responses from the connection opened by connect_async(). Must be called with _async_lock held."""
+        responses = []
+        for _ in range(n):
+            responses.append(await self._reader.readuntil(Laser._RESPONSE_TERMINATOR))
+        return responses
 
     def fire(self):
         """
             Sends commands to laser to have it fire
         """
-        status = self.get_status()
+        status = self.get_status(force=True)
         
         if self.pulseMode == 0: # continuous
             fire_duration = 1 / self.repRate
@@ -275,7 +625,7 @@ class Laser:
         
         if fire_duration >= 3: # Start the kicker thread
             print("Starting kicker...")
-            self._kicker.start()
+            self._start_kicker()
 
         print("Laser firing...") 
         fire_response = self._send_command('FL 1')
@@ -283,39 +633,110 @@ class Laser:
             self._send_command('FL 0') # aborts if laser fails to fire
             raise LaserCommandError(Laser.get_error_code_description(fire_response))
  
+    def _start_kicker(self):
+        """Starts the kicker, which runs _kicker_callback every _kicker_interval seconds until _kicker_stop is set."""
+        if not self.use_kicker_thread:
+            self._kicker_stop.clear()
+            self._kicker_next = time.monotonic() + self._kicker_interval
+            return
+        if self._kicker_thread is not None and self._kicker_thread.is_alive():
+            if not self._kicker_stop.is_set():
+                return # already watching
+            # Told to stop (e.g. by emergency_stop()) but not exited yet. Returning here would leave the new fire without a
+            # kicker once it exits, so wait for it to finish and start a fresh one.
+            self._kicker_thread.join()
+        self._kicker_stop.clear()
+        self._kicker_thread = thread.Thread(target=self._kicker_loop, daemon=True)
+        self._kicker_thread.start()
+
+    def _kicker_loop(self):
+        while not self._kicker_stop.wait(self._kicker_interval):
+            self._kicker_callback(self)
+
+    def poll(self):
+        """
+        Runs the kicker from the caller's own loop instead of a background thread, see use_kicker_thread.
+        Should be called at least every _kicker_interval seconds while the laser is firing, calls in between are cheap.
+
+        Returns
+        -------
+        active : bool
+            True while the kicker is still watching the laser fire, False once it is done.
+        """
+        if self._kicker_next is None:
+            return False
+        if self._kicker_stop.is_set():
+            self._kicker_next = None
+            return False
+
+        if time.monotonic() >= self._kicker_next:
+            self._kicker_next += self._kicker_interval
+            self._kicker_callback(self)
+            if self._kicker_stop.is_set():
+                self._kicker_next = None
+                return False
+        return True
+
     def _kicker_callback(self, laser):
         try:
-            status = laser.get_status()
-        except LaserCommandError as e:
-            laser._send_command("FL 0")
-            laser._kicker.stop()
+            status = laser.get_status(force=True)
+        except (LaserCommandError, ValueError, OSError, serial.SerialException):
+            # An error response, a garbled or truncated reply (e.g. the ok from an emergency_stop() written mid-read), or a
+            # failing port. All of these are a failed status check.
+            status = None
 
         if not status:
-            laser._send_command("FL 0") # We got an error while asking for the status, best idea to stop firing
-            laser._kicker.stop()
+            laser._kicker_stop.set()
+            try:
+                laser._send_command("FL 0") # We got an error while asking for the status, best idea to stop firing
+            except (OSError, serial.SerialException):
+                pass # the port is gone, there is nothing else to try
+            return
  
         if not status.laser_active and laser._fire_timer > laser.fire_duration:
-            laser._kicker.stop()
+            laser._kicker_stop.set()
             laser._fire_timer = 0
         else:
             laser._fire_timer += laser._kicker_interval
 
     def emergency_stop(self):
-        """Immediately sends command to laser to stop firing
+        """Immediately sends command to laser to stop firing, and stops the kicker.
+
+        The stop command is written straight away without waiting for the serial line, which another thread may be holding
+        while it waits on a response. Its response is NOT checked. Afterwards FL 0 is sent again as a regular command to
+        confirm the stop, if the serial line frees up within _emergency_stop_timeout seconds. FL 0 is idempotent, so
+        sending it twice is always safe.
         
         Returns
         -------
         valid : bool
-            If the command sent to the laser was processed properly, this should show as True. Otherwise an error will be raised.
+            True if the confirming command was processed properly. False if the serial line was busy and the stop command
+            could only be sent without checking its response. Otherwise an error will be raised.
         """
         self.emergencyStopActive = True
-        if self.fireThread not in self._threads:    # Checking if fireThread is an active thread
+        self._kicker_stop.set()
+        if not self.connected:
+            raise ConnectionError("Not connected to a serial port. Please call connect() before issuing any commands!")
+
+        try:
+            with self._write_lock: # intentionally not _lock, only waits for a write in progress to finish
+                self._write(self._fixed_frames['FL 0'])
+        except (serial.SerialException, OSError):
+            pass # best-effort, the confirming command below will report the problem if it persists
+        self._cache_clear()
+
+        if not self._lock.acquire(timeout=self._emergency_stop_timeout):
+            return False
+
+        try:
             response = self._send_command('FL 0')
-            if response == b"ok\r\n":
-                return True
-            else:
-                raise LaserCommandError(Laser.get_error_code_description(response))
-            
+        finally:
+            self._lock.release()
+
+        if response == b"ok\r\n":
+            return True
+        raise LaserCommandError(Laser.get_error_code_description(response))
+
     def arm(self):
         """Sends command to laser to arm. Returns True on nominal response.
         
@@ -345,142 +766,106 @@ class Laser:
             return True
         raise LaserCommandError(Laser.get_error_code_description(response))
 
-    def is_armed(self):
+    def is_armed(self, force=False):
         """
-        Checks if the laser is armed
+        Checks if the laser is armed. Repeated calls within _status_ttl seconds reuse the last response.
+
+        Parameters
+        ----------
+        force : bool
+            Default set to False. Always query the laser if set to True.
+
         Returns
         -------
         armed : boolean
             True if the laser is armed. False if the laser is not armed.
         """
+        if not force:
+            armed = self._cache_get('EN?', self._status_ttl)
+            if armed is not None:
+                return armed
+
+        generation = self._cache_generation
         response = self._send_command('EN?')
-        if not response or response[0] == b"?":
+        if not response or response.startswith(_ERR_PREFIX):
             raise LaserCommandError(Laser.get_error_code_description(response))
 
-        return response[0] == b'1' # This has been tested on the driver box
+        return self._cache_put('EN?', response[:1] == b'1', generation) # This has been tested on the driver box. Sliced, since indexing bytes gives an int
 
-    def get_resonator_temp(self):
+    def get_resonator_temp(self, force=False):
         """
-        Checks the resonator temperature the laser
+        Checks the resonator temperature the laser. Repeated calls within _sensor_ttl seconds reuse the last reading.
+
+        Parameters
+        ----------
+        force : bool
+            Default set to False. Always query the laser if set to True.
 
         Returns
         -------
         resonator_temp : float
             Returns the float value of the resonator temperature in Celsius.
         """
+        if not force:
+            temp = self._cache_get('TR?', self._sensor_ttl)
+            if temp is not None:
+                return temp
+
+        generation = self._cache_generation
         response = self._send_command('TR?')
-        if not response or response[0] == b"?":
+        if not response or response.startswith(_ERR_PREFIX):
             raise LaserCommandError(Laser.get_error_code_description(response))
-        return float(response.decode('ascii'))
+        return self._cache_put('TR?', float(response), generation)
 
-    def get_fet_temp(self):
+    def get_fet_temp(self, force=False):
         """
-        Checks the FET temperature the laser
+        Checks the FET temperature the laser. Repeated calls within _sensor_ttl seconds reuse the last reading.
+
+        Parameters
+        ----------
+        force : bool
+            Default set to False. Always query the laser if set to True.
 
         Returns
         -------
         fet : float
             Returns the float value of the FET temperature in Celsius.
         """
-        response = self._send_command('FT?')
-        if response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        return float(response[:-1].decode('ascii'))
-
-    def get_fet_voltage(self):
-        """
-        Checks the FET voltage of the laser
+        if not force:
+            temp = self._cache_get('FT?', self._sensor_ttl)
+            if temp is not None:
+                return temp
 
-        Returns
-        -------
-        fet_voltage : float
-            Returns the float value of the FET voltage
-        """
-        response = self._send_command('FV?')
-        if response[0] == b"?":
+        generation = self._cache_generation
+        response = self._send_command('FT?')
+        if not response or response.startswith(_ERR_PREFIX):
             raise LaserCommandError(Laser.get_error_code_description(response))
-        return float(response.decode('ascii'))    #TODO: All responce[:-4] does is returns b'', what is the purpose of this... It should be returning the actual data, something like responce [:-1] would remove the \r and leave just data
+        return self._cache_put('FT?', float(response), generation)
 
-    def get_diode_current(self):
+    def get_bank_voltage(self, force=False):
         """
-        Checks current to diode of the laser
+        This command requests to see what value the laser's bank voltage is at. Repeated calls within _sensor_ttl seconds reuse the last reading.
 
-        Returns
-        -------
-        diode_current : float
-            Returns the float value of the diode current
-        """
-        response = self._send_command('IM?')
-        if response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        return float(response.decode('ascii'))
-
-    def get_bank_voltage(self):
-        """
-        This command requests to see what value the laser's bank voltage is at.
+        Parameters
+        ----------
+        force : bool
+            Default set to False. Always query the laser if set to True.
         
         Returns
         -------
         bank_voltage : float
             Returns the float value of the laser's bank voltage.
         """
-        response = self._send_command('BV?')
-        if response[0] == b'?':
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        response_str = response.decode('ascii')
-        return float(response_str)
-
-    def get_laser_ID(self):
-        """
-        This command requests to see what the laser's ID value is.
-
-        Returns
-        -------
-        ID : str
-            Returns a string containing the laser's ID information
-        """
-        response = self._send_command('ID?')
-        if response[0] == b'?':
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        response_str = str(response[:-1].decode('ascii'))
-        return response_str
+        if not force:
+            voltage = self._cache_get('BV?', self._sensor_ttl)
+            if voltage is not None:
+                return voltage
 
-    def get_latched_status(self):
-        """
-        This command requests to see what the laser's latched status is.
-
-        Returns
-        -------
-        latched_status : str
-            Returns a string containing the laser's latched status
-        """
-        #Returns b'0\r' when the remote interlock is in, and returns b'64\r' when the remote interlock is out.
-        response = self._send_command('LS?')
-        if response[0] == b'?':
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        response_str = str(response[:-1].decode('ascii'))
-        return response_str
-
-    def get_system_shot_count(self):
-        """
-        This command requests to see what the laser's system shot count is.
-
-        Returns
-        -------
-        system_SC : int
-            Returns the system shot count since factory build.
-        """
-        response = self._send_command('SC?')
-        if response[0] == b'?':
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        response_str = str(response.decode('ascii'))
-        return int(response_str)
-
-    def get_pulse_mode(self):
-        response = self._send_command("PM?")
-        if not response or response[0] == b"?":
+        generation = self._cache_generation
+        response = self._send_command('BV?')
+        if not response or response.startswith(_ERR_PREFIX):
             raise LaserCommandError(Laser.get_error_code_description(response))
-        return int(response)
+        return self._cache_put('BV?', float(response), generation)
 
     def set_pulse_mode(self, mode):
         """Sets the laser pulse mode. 0 = continuous, 1 = single shot, 2 = burst. Returns True on nominal response.
@@ -495,7 +880,11 @@ class Laser:
         valid : bool
             If the command sent to the laser was processed properly, this should show as True. Otherwise an error will be raised.
         """
-        if not mode in (0,1,2) or not type(mode) == int:
+        try:
+            mode = _as_int(mode)
+        except TypeError:
+            raise ValueError("Invalid value for pulse mode! 0, 1, or 2 are accepted values.") from None
+        if mode not in (0, 1, 2):
             raise ValueError("Invalid value for pulse mode! 0, 1, or 2 are accepted values.")
 
         response = self._send_command("PM " + str(mode))
@@ -527,12 +916,20 @@ class Laser:
             return True
         raise LaserCommandError(Laser.get_error_code_description(response))
 
-    def get_pulse_period(self):
-        response = self._send_command("PE?")
-        if not response or response[0] == b'?':
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        return float(response)
-        
+    def _get_range(self, param):
+        """
+        Queries the minimum and maximum of param (e.g. "PE") in a single round-trip. These are limits of the laser itself, so
+        they are only queried once per connection.
+        """
+        limits = self._ranges.get(param)
+        if limits is None:
+            responses = self._send_commands([param + ":MIN?", param + ":MAX?"])
+            for response in responses:
+                if not response or response.startswith(_ERR_PREFIX):
+                    raise LaserCommandError(Laser.get_error_code_description(response))
+            limits = self._ranges[param] = (float(responses[0]), float(responses[1]))
+        return limits
+
     def get_pulse_period_range(self):
         """Returns the min and max periods for firing.
         
@@ -541,23 +938,7 @@ class Laser:
         range : tuple
             Item at index 0 is the minimum period, and item at index 1 is the maximum period.
         """
-        min_response = self._send_command("PE:MIN?")
-        if min_response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(min_response))
-        minimum = float(min_response)
-
-        max_response = self._send_command("PE:MAX?")
-        if max_response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(max_response))
-        maximum = float(max_response)
-            
-        return (minimum, maximum)
-
-    def get_diode_trigger(self):
-        response = self._send_command("DT?")
-        if not response or response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        return int(response)
+        return self._get_range("PE")
 
     def set_diode_trigger(self, trigger):
         """Sets the diode trigger mode. 0 = Software/internal. 1 = Hardware/external trigger. Returns True on nominal response.
@@ -572,7 +953,11 @@ class Laser:
         valid : bool
             If the command sent to the laser was processed properly, this should show as True. Otherwise an error will be raised.
         """
-        if trigger != 0 and trigger != 1 or not type(trigger) == int:
+        try:
+            trigger = _as_int(trigger)
+        except TypeError:
+            raise ValueError("Invalid value for trigger mode! 0 or 1 are accepted values.") from None
+        if trigger not in (0, 1):
             raise ValueError("Invalid value for trigger mode! 0 or 1 are accepted values.")
 
         response = self._send_command("DT " + str(trigger))
@@ -595,10 +980,12 @@ class Laser:
             If the command sent to the laser was processed properly, this should show as True. Otherwise an error will be raised.
         """
 
-        if type(width) != int and type(width) != float or width <= 0:
-            raise ValueError("Pulse width must be a positive, non-zero number value (no strings)!")
-
-        width = float(width)
+        try:
+            width = _as_float(width)
+        except (TypeError, ValueError):
+            raise ValueError("Pulse width must be a positive, non-zero number value!") from None
+        if not width > 0: # also catches NaN
+            raise ValueError("Pulse width must be a positive, non-zero number value!")
 
         response = self._send_command("DW " + str(width))
         if response == b"ok\r\n":
@@ -606,12 +993,6 @@ class Laser:
             return True
         raise LaserCommandError(Laser.get_error_code_description(response))
         
-    def get_pulse_width(self):
-        response = self._send_command("DW?")
-        if not response or response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        return float(response)
-
     def set_burst_count(self, count):
         """Sets the burst count of the laser. Must be a positive non-zero integer. Returns True on nominal response, False otherwise.
         
@@ -625,7 +1006,11 @@ class Laser:
         valid : bool
             If the command sent to the laser was processed properly, this should show as True. Otherwise an error will be raised.
         """
-        if count <= 0 or not type(count) == int:
+        try:
+            count = _as_int(count)
+        except TypeError:
+            raise ValueError("Burst count must be a positive, non-zero integer!") from None
+        if count <= 0:
             raise ValueError("Burst count must be a positive, non-zero integer!")
 
         response = self._send_command("BC " + str(count))
@@ -635,13 +1020,6 @@ class Laser:
             return True
         raise LaserCommandError(Laser.get_error_code_description(response))
 
-    def get_burst_count(self):
-        """Retreives the burst count of the laser."""
-        response = self._send_command("BC?")
-        if response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        return int(response)
-
     def set_repetition_rate(self, rate):
         """Sets the repetition rate of the laser. Rate must be a positive integer from 1 to 5 (# of Hz allowed). Returns True on nominal response, False otherwise.
         
@@ -655,7 +1033,11 @@ class Laser:
         valid : bool
             If the command sent to the laser was processed properly, this should show as True. Otherwise an error will be raised.
         """
-        if not (type(rate) == int or type(rate) == float) or rate < 1 or rate > 5:
+        try:
+            rate = _as_number(rate)
+        except (TypeError, ValueError):
+            raise ValueError("Laser repetition rate must be a positive number from 1 to 5!") from None
+        if not 1 <= rate <= 5:
             raise ValueError("Laser repetition rate must be a positive number from 1 to 5!")
 
         response = self._send_command("RR " + str(rate))
@@ -665,15 +1047,6 @@ class Laser:
             return True
         raise LaserCommandError(Laser.get_error_code_description(response))
 
-    def get_repetition_rate(self):
-        response = self._send_command("RR?")
-        if not response:
-            return
-        if response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(response))
-        
-        return float(response)
-
     def get_repetition_rate_range(self):
         """Gets the minimum and maximum repitition rate for firing.
         
@@ -682,17 +1055,7 @@ class Laser:
         range : tuple
             Item at index 0 is the minimum repitition rate, and item at index 1 is the maximum repitition rate.
         """
-        min_response = self._send_command("RR:MIN?")
-        if not min_response or min_response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(min_response))
-        minimum = float(min_response)
-
-        max_response = self._send_command("RR:MAX?")
-        if not max_response or max_response[0] == b"?":
-            raise LaserCommandError(Laser.get_error_code_description(max_response))
-        maximum = float(max_response)
-            
-        return (minimum, maximum)
+        return self._get_range("RR")
 
     def set_diode_current(self, current):
         """Sets the diode current of the laser. Must be a positive non-zero integer (maybe even a float?). Returns True on nominal response, False otherwise.
@@ -707,7 +1070,11 @@ class Laser:
         valid : bool
             If the command sent to the laser was processed properly, this should show as True. Otherwise an error will be raised.
         """
-        if (type(current) != int and type(current) != float) or current <= 0:
+        try:
+            current = _as_number(current)
+        except (TypeError, ValueError):
+            raise ValueError("Diode current must be a positive, non-zero number!") from None
+        if not current > 0:
             raise ValueError("Diode current must be a positive, non-zero number!")
 
         response = self._send_command("DC " + str(current))
@@ -740,10 +1107,11 @@ class Laser:
         cmd_strings.append('EM ' + str(self.energyMode))
         cmd_strings.append('PM ' + str(self.pulseMode))
         cmd_strings.append('DW ' + str(self.pulseWidth))
-        cmd_strings.append('DT ' + str(self.pulseMode))
+        cmd_strings.append('DT ' + str(self.diodeTrigger))
 
-        for i in cmd_strings:
-            self._send_command(i)
+        for response in self._send_commands(cmd_strings):
+            if response != b"ok\r\n":
+                raise LaserCommandError(Laser.get_error_code_description(response))
 
     @staticmethod
     def get_error_code_description(code):
@@ -752,25 +1120,36 @@ class Laser:
         """
         if not code:
             return "No response received from laser in time."
-        
-        if code == b'?1\r\n':
-            return "Command not recognized."
-        elif code == b'?2\r\n':
-            return "Missing command keyword."
-        elif code == b'?3\r\n':
-            return "Invalid command keyword."
-        elif code == b'?4\r\n':
-            return "Missing Parameter"
-        elif code == b'?5\r\n':
-            return "Invalid Parameter"
-        elif code == b'?6\r\n':
-            return "Query only. Command needs a question mark."
-        elif code == b'?7\r\n':
-            return "Invalid query. Command does not have a query function."
-        elif code == b'?8\r\n':
-            return "Command unavailable in current system state."
-        else:
+
+        description = Laser._ERROR_CODES.get(code)
+        if description is None:
             return "Error description not found, response code given: " + str(code)
+        return description
+
+# Same layout as the hand-written getters' docstrings
+_QUERY_DOC = """
+        {0}
+
+        Returns
+        -------
+        {1} : {2}
+            {3}
+        """
+
+def _make_query(name, cmd, parser, summary, returns):
+    def query(self):
+        response = self._raw_command(self._fixed_frames[cmd])
+        if not response or response.startswith(_ERR_PREFIX):
+            raise LaserCommandError(Laser.get_error_code_description(response))
+        return parser(response)
+    query.__name__ = name
+    query.__qualname__ = "Laser." + name
+    query.__doc__ = _QUERY_DOC.format(summary, *returns)
+    return query
+
+for _query in _QUERIES:
+    setattr(Laser, _query[0], _make_query(*_query))
+del _query
 
 def list_available_ports():
     return serial.tools.list_ports.comports()
@@ -40,6 +40,11 @@ class Serial:
         self._isOpen = False
         return None
 
+    def reset_input_buffer(self):
+        """ Mocks the pyserial reset_input_buffer() function, discards any responses that haven't been read yet """
+        self._sendData = ''
+        return None
+
     def clearSerial(self):
         """
         This is a debugging only command that is not included in pyserial. The purpose of this function is to clear out a clogged 'RX port' (basically meaning clearing all of the data that our fake serial has recieved)
@@ -0,0 +1,39 @@
+import pytest
+import serial
+from unittest.mock import Mock
+from ujlaser.lasercontrol import Laser
+
+@pytest.fixture(scope="module")
+def laser_factory():
+    """
+    Returns a function that hands out a connected Laser wired to a mock serial port.
+    The mock is only built once per module (building Mocks is slow), each call just resets it. Every call gets a new
+    Laser, so cached query answers and settings never leak from one test into the next.
+
+    Parameters (of the returned function)
+    ----------
+    response : bytes
+        What every read_until() call returns, the normal "ok" response by default.
+
+    side_effect : list
+        Responses returned by read_until() one after another, used instead of response when given.
+
+    Returns (of the returned function)
+    ----------
+    (laser, serial_mock) : tuple
+    """
+    serial_mock = Mock(spec_set=serial.Serial) # anything Laser uses that a real port doesn't have fails instead of silently passing
+
+    def make_laser(response=b"ok\r\n", side_effect=None):
+        serial_mock.reset_mock(return_value=True, side_effect=True) # also drops anything a previous test set up
+        serial_mock.read_until.return_value = response
+        serial_mock.read_until.side_effect = side_effect
+        serial_mock.timeout = 1
+
+        l = Laser()
+        l._ser = serial_mock
+        l._bind_serial()
+        l.connected = True
+        return l, serial_mock
+
+    return make_laser
@@ -1,271 +1,632 @@
-import unittest
-from unittest.mock import Mock
+import asyncio
+import os
+import time
+import threading
+import pytest
+import serial
+from unittest.mock import AsyncMock, Mock, patch
+from ujlaser import lasercontrol
 from ujlaser.lasercontrol import Laser, LaserCommandError, LaserStatusResponse
 
-class TestLaserCommands(unittest.TestCase):
-
-    def test_not_connected(self):
-        """Laser object should raise a ConnectionError if __send_command is sent without being connected to a serial device."""
-        l = Laser()
-        assert l.connected == False
-        assert l._ser == None
-        with self.assertRaises(ConnectionError):
-            l.is_armed()
-        with self.assertRaises(ConnectionError): # try two different commands for good measure
-            l.get_status()
-
-    def test_device_address(self):
-        """The only device address listed in the microjewel manual is 'LA'. Make sure this is set correctly in the code."""
-        l = Laser()
-        assert l._device_address == "LA"
-
-    def test_constants(self):
-        """Ensures that the constants/enums set for energy modes and pulse modes are correct according to the user manual."""
-        assert Laser.MANUAL_ENERGY == 0
-        assert Laser.LOW_ENERGY == 1
-        assert Laser.HIGH_ENERGY == 2
-
-        assert Laser.CONTINUOUS == 0
-        assert Laser.SINGLE_SHOT == 1
-        assert Laser.BURST == 2
-
-    def test_send_command(self):
-        """Tests Laser._send_command, feeds in a mock serial object. Checking to make sure that write is called and that it returns the reponse we give it."""
-        serial_mock = Mock()
-
-        serial_mock.read_until = Mock(return_value=b"ok\r\n")
-        serial_mock.write = Mock()
-
-        l = Laser()
-        with self.assertRaises(ConnectionError):
-            l._send_command("HELLO THERE") # This should throw an exception because we have not connected it to a serial object.
-        
-        l._ser = serial_mock
-        l.connected = True
-        assert l._send_command("HELLO WORLD") == b"ok\r\n" # Ensure that we are returning the serial response
-        serial_mock.write.assert_called_once_with(";LA:HELLO WORLD\r".encode("ascii")) # Ensure that the correct command format is being used
-
-    def test_arm_command(self):
-        """Tests Laser.arm(), should return True because we are feeding it a nominal response, and this should result in serial.write being called with the correct command"""
-        serial_mock = Mock()
-        serial_mock.read_until = Mock(return_value=b"ok\r\n")
-        serial_mock.write = Mock() # NOTE: Major difference from pyserial class, does not return the number of bytes written.
-
-        l = Laser()
-
-        # Connect our laser to our mock serial
-        l._ser = serial_mock
-        l.connected = True
-
-        # Now check the arm command
-        assert l.arm() == True
-        
-        serial_mock.write.assert_any_call(";LA:EN?\r".encode("ascii"))
-        serial_mock.write.assert_any_call(";LA:EN 1\r".encode("ascii"))
-
-    def test_disarm_command(self):
-        """Tests Laser.disarm(), should return True because we are feeding it a nominal response, and this should result in serial.write being called with the correct command"""
-        serial_mock = Mock()
-        serial_mock.read_until = Mock(return_value=b"ok\r\n")
-        serial_mock.write = Mock() # NOTE: Major difference from pyserial class, does not return the number of bytes written.
-
-        l = Laser()
-
-        # Connect our laser to our mock serial
-        l._ser = serial_mock
-        l.connected = True
-
-        # Now check the arm command
-        assert l.disarm() == True
-        serial_mock.write.assert_called_once_with(";LA:EN 0\r".encode("ascii"))
-
-    def test_status_class(self):
-        """Tests to make sure the LaserStatusResponse class parses response strings correctly."""
-        s = LaserStatusResponse(b'3075\r') # This example is pulled from the user manual
-        assert s.ready_to_enable
-        assert s.ready_to_fire
-        assert s.laser_enabled
-        assert s.laser_active
-        assert not s.high_power_mode
-        assert not s.low_power_mode
-        assert not s.resonator_over_temp
-        assert not s.electrical_over_temp
-        assert not s.external_interlock
-
-    def test_get_status(self):
-        """Tests to make sure that the get_status() function operates properly."""
-
-        serial_mock = Mock()
-        serial_mock.read_until = Mock(return_value=b"?1\r")
-        serial_mock.write = Mock()
-
-        l = Laser()
-        l._ser = serial_mock # Inject our mock function and play it as if it's a serial.Serial object
-        l.connected = True # Also needed for injection
-
-        with self.assertRaises(LaserCommandError):
-            l.get_status()
-
-        serial_mock.write.assert_called_once_with(";LA:SS?\r".encode("ascii"))
-        # Reset our read and write mocks
-        serial_mock.read_until = Mock(return_value=b"3075\r")
-        serial_mock.write = Mock()
-        l._ser = serial_mock
-
-        status = l.get_status()
-
-        serial_mock.write.assert_called_once_with(";LA:SS?\r".encode("ascii"))
-
-        assert status.laser_active
-        assert status.laser_enabled
-        assert status.ready_to_fire
-        assert status.ready_to_enable
-        assert not status.diode_external_trigger
-        assert not status.high_power_mode
-        assert not status.low_power_mode
-        assert not status.resonator_over_temp
-        assert not status.electrical_over_temp
-        assert not status.external_interlock
-
-    def test_diode_trigger_command(self):
-        """Tests Laser.set_diode_trigger, feeds in a mock serial object. Makes sure that the correct data is written and that the properties of the class are changed."""
-        serial_mock = Mock()
-
-        serial_mock.read_until = Mock(return_value=b"ok\r\n")
-        serial_mock.write = Mock()
-
-        l = Laser()
-        l._ser = serial_mock
-        l.connected = True
-
-        with self.assertRaises(ValueError):
-            l.set_diode_trigger(6)
-
-        with self.assertRaises(ValueError):
-            l.set_diode_trigger("this is not an integer")
-
-        assert l.set_diode_trigger(1)
-        serial_mock.write.assert_called_once_with(";LA:DT 1\r".encode("ascii"))
-        assert l.diodeTrigger == 1
-
-        serial_mock.read_until = Mock(return_value=b"?1\r\n") # Make sure we return False is the laser returns an error
-        serial_mock.write = Mock()
-
-        with self.assertRaises(LaserCommandError):
-            l.set_diode_trigger(0)
-
-        serial_mock.write.assert_called_once_with(";LA:DT 0\r".encode("ascii"))
-        assert l.diodeTrigger == 1 # This value should have NOT changed since this command failed.
-
-    def test_get_pulse_period_range(self):
-        """Tests Laser.get_pulse_period_range"""
-        serial_mock = Mock()
-        
-        serial_mock.read_until = Mock()
-        test_range = [0.00002, 0.002]
-        serial_mock.read_until.side_effect = [str(test_range[0]).encode("ascii"), str(test_range[1]).encode("ascii")]
-        serial_mock.write = Mock()
-
-        l = Laser()
-        l._ser = serial_mock
-        l.connected = True
-        
-        minimum, maximum = l.get_pulse_period_range()
-        assert minimum == test_range[0]
-        assert maximum == test_range[1]
-        serial_mock.write.assert_any_call(";LA:PE:MIN?\r".encode("ascii"))
-        serial_mock.write.assert_any_call(";LA:PE:MAX?\r".encode("ascii"))
-        
-    def test_get_repetition_rate_range(self):
-        """Tests Laser.get_pulse_period_range"""
-        serial_mock = Mock()
-        
-        serial_mock.read_until = Mock()
-        test_range = [1.0, 5.0]
-        serial_mock.read_until.side_effect = [str(test_range[0]).encode("ascii"), str(test_range[1]).encode("ascii")]
-        serial_mock.write = Mock()
-
-        l = Laser()
-        l._ser = serial_mock
-        l.connected = True
-        
-        minimum, maximum = l.get_repetition_rate_range()
-        assert minimum == test_range[0]
-        assert maximum == test_range[1]
-        serial_mock.write.assert_any_call(";LA:RR:MIN?\r".encode("ascii"))
-        serial_mock.write.assert_called_once_with(";LA:DT 0\r".encode("ascii"))
-        assert l.diodeTrigger == 1 # This value should have NOT changed since this command failed.
-
-    def test_get_pulse_period_range(self):
-        """Tests Laser.get_pulse_period_range"""
-        serial_mock = Mock()
-        
-        serial_mock.read_until = Mock()
-        test_range = [0.00002, 0.002]
-        serial_mock.read_until.side_effect = [str(test_range[0]).encode("ascii"), str(test_range[1]).encode("ascii")]
-        serial_mock.write = Mock()
-
-        l = Laser()
-        l._ser = serial_mock
-        l.connected = True
-        
-        minimum, maximum = l.get_pulse_period_range()
-        assert minimum == test_range[0]
-        assert maximum == test_range[1]
-        serial_mock.write.assert_any_call(";LA:PE:MIN?\r".encode("ascii"))
-        serial_mock.write.assert_any_call(";LA:PE:MAX?\r".encode("ascii"))
-        
-    def test_get_repetition_rate_range(self):
-        """Tests Laser.get_pulse_period_range"""
-        serial_mock = Mock()
-        
-        serial_mock.read_until = Mock()
-        test_range = [1.0, 5.0]
-        serial_mock.read_until.side_effect = [str(test_range[0]).encode("ascii"), str(test_range[1]).encode("ascii")]
-        serial_mock.write = Mock()
-
+# Frames the tests expect Laser to write, encoded once here
+_HELLO_WORLD = b";LA:HELLO WORLD\r"
+_EN_QUERY = b";LA:EN?\r"
+_EN_1 = b";LA:EN 1\r"
+_EN_0 = b";LA:EN 0\r"
+_SS_QUERY = b";LA:SS?\r"
+_FL_0 = b";LA:FL 0\r"
+_ID_QUERY = b";LA:ID?\r"
+_PM_QUERY = b";LA:PM?\r"
+_PE_QUERY = b";LA:PE?\r"
+_DT_1 = b";LA:DT 1\r"
+_DT_0 = b";LA:DT 0\r"
+_DW_0_1 = b";LA:DW 0.1\r"
+_DW_0_2 = b";LA:DW 0.2\r"
+_DW_0_5 = b";LA:DW 0.5\r"
+_RR_2 = b";LA:RR 2\r"
+_RR_2_5 = b";LA:RR 2.5\r"
+_DC_5 = b";LA:DC 5\r"
+_DC_5_5 = b";LA:DC 5.5\r"
+_PE_RANGE_QUERY = b";LA:PE:MIN?\r;LA:PE:MAX?\r"
+_RR_RANGE_QUERY = b";LA:RR:MIN?\r;LA:RR:MAX?\r"
+_REFRESH_QUERIES = b";LA:PM?\r;LA:PE?\r;LA:RR?\r;LA:BC?\r;LA:DW?\r;LA:DT?\r"
+
+def test_not_connected():
+    """Laser object should raise a ConnectionError if __send_command is sent without being connected to a serial device."""
+    l = Laser()
+    assert l.connected == False
+    assert l._ser == None
+    with pytest.raises(ConnectionError):
+        l.is_armed()
+    with pytest.raises(ConnectionError): # try two different commands for good measure
+        l.get_status()
+
+def test_device_address():
+    """The only device address listed in the microjewel manual is 'LA'. Make sure this is set correctly in the code."""
+    l = Laser()
+    assert l._device_address == "LA"
+    assert l._frame("SS?") == b";LA:SS?\r" # The address has to make it into the frames
+    assert l._frame("DW 0.5") == b";LA:DW 0.5\r"
+
+def test_constants():
+    """Ensures that the constants/enums set for energy modes and pulse modes are correct according to the user manual."""
+    assert Laser.MANUAL_ENERGY == 0
+    assert Laser.LOW_ENERGY == 1
+    assert Laser.HIGH_ENERGY == 2
+
+    assert Laser.CONTINUOUS == 0
+    assert Laser.SINGLE_SHOT == 1
+    assert Laser.BURST == 2
+
+def test_error_code_description():
+    """Ensures that the error responses listed in the user manual are translated, and that anything else is still reported."""
+    assert Laser.get_error_code_description(b"?1\r\n") == "Command not recognized."
+    assert Laser.get_error_code_description(b"?8\r\n") == "Command unavailable in current system state."
+    assert Laser.get_error_code_description(None) == "No response received from laser in time."
+    assert Laser.get_error_code_description(b"") == "No response received from laser in time."
+    assert "?9" in Laser.get_error_code_description(b"?9\r\n")
+
+def test_connect_low_latency():
+    """Laser.connect should request low latency mode from the serial driver, but still connect on platforms that don't support it."""
+    serial_mock = Mock(spec=serial.Serial)
+
+    l = Laser()
+    l.connect(serial_mock)
+    assert l.connected
+    serial_mock.set_low_latency_mode.assert_called_once_with(True)
+    assert l._write is serial_mock.write # bound once when connecting
+    assert l._read_until is serial_mock.read_until
+
+    serial_mock = Mock(spec=serial.Serial)
+    serial_mock.set_low_latency_mode.side_effect = NotImplementedError
+
+    l = Laser()
+    l.connect(serial_mock)
+    assert l.connected
+
+    serial_mock = Mock(spec=serial.Serial)
+
+    l = Laser()
+    l.connect(serial_mock, low_latency=False)
+    serial_mock.set_low_latency_mode.assert_not_called()
+
+def test_send_command(laser_factory):
+    """Tests Laser._send_command, feeds in a mock serial object. Checking to make sure that write is called and that it returns the reponse we give it."""
+    l = Laser()
+    with pytest.raises(ConnectionError):
+        l._send_command("HELLO THERE") # This should throw an exception because we have not connected it to a serial object.
+
+    l, serial_mock = laser_factory(b"ok\r\n")
+    assert l._send_command("HELLO WORLD") == b"ok\r\n" # Ensure that we are returning the serial response
+    serial_mock.write.assert_called_once_with(_HELLO_WORLD) # Ensure that the correct command format is being used
+    serial_mock.read_until.assert_called_once_with(b"\r\n", 256) # The terminator must be bytes, a str never matches and every read would wait out the timeout
+
+    serial_mock.write.reset_mock()
+    l._send_command(b"DW 0.5") # Already encoded commands should be framed the same way
+    serial_mock.write.assert_called_once_with(_DW_0_5)
+
+@pytest.mark.skipif(os.name != "posix", reason="select() on file descriptors is only used on POSIX")
+def test_read_response_fd(laser_factory):
+    """On POSIX the response is read straight from the port's file descriptor. A pipe stands in for the serial port here."""
+    read_fd, write_fd = os.pipe()
+    try:
+        l, serial_mock = laser_factory()
+        serial_mock.timeout = 0.05
+        l._fd = read_fd
+
+        os.write(write_fd, b"ok\r\n")
+        assert l._send_command("EN 1") == b"ok\r\n"
+        serial_mock.read_until.assert_not_called()
+
+        os.write(write_fd, b"2\r\n0.5\r\n") # Both responses arriving in one read should still be split up correctly
+        assert l._send_commands(["PM?", "PE?"]) == [b"2\r\n", b"0.5\r\n"]
+
+        os.write(write_fd, b"30") # Partial response, the read should give up once the timeout is reached
+        assert l._send_command("BC?") == b"30"
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+@pytest.mark.skipif(os.name != "posix", reason="select() on file descriptors is only used on POSIX")
+def test_read_response_fd_python(laser_factory):
+    """The pure Python read loop must behave the same as the C one, it's used whenever the extension isn't built."""
+    with patch.object(lasercontrol, "_read_frame", None):
+        test_read_response_fd(laser_factory)
+
+@pytest.mark.skipif(lasercontrol._read_frame is None, reason="C extension not built")
+def test_read_frame():
+    """read_frame() returns one response and hands back whatever was read past it."""
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, b"\r\n0.5\r\n")
+        assert lasercontrol._read_frame(read_fd, b"2", b"\r\n", 0.05, 256) == (b"2\r\n", b"0.5\r\n")
+        assert lasercontrol._read_frame(read_fd, b"0.5\r\n", b"\r\n", 0.05, 256) == (b"0.5\r\n", b"")
+        os.write(write_fd, b"x" * 300) # no terminator, cut short at the length cap
+        assert lasercontrol._read_frame(read_fd, b"", b"\r\n", 0.05, 256) == (b"x" * 256, b"")
+        assert lasercontrol._read_frame(read_fd, b"", b"\r\n", 0.05, 256) == (b"x" * 44, b"") # timed out
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+def test_stale_input_discarded(laser_factory):
+    """Anything left in the input buffer (e.g. a late reply to a command that timed out) must be dropped before a new command is written, or it would be read as that command's response."""
+    l, serial_mock = laser_factory(b"ok\r\n")
+
+    l._send_command("EN 1")
+    assert [c[0] for c in serial_mock.method_calls] == ["reset_input_buffer", "write", "read_until"]
+
+    serial_mock.reset_mock()
+    l._send_commands(["PM?", "PE?"])
+    assert [c[0] for c in serial_mock.method_calls] == ["reset_input_buffer", "write", "read_until", "read_until"]
+
+def test_read_response_chunked():
+    """Without a usable file descriptor (e.g. on Windows), a real pyserial port should be read a whole burst at a time instead of a byte at a time."""
+    serial_mock = Mock(spec=serial.Serial)
+    serial_mock.timeout = 1
+
+    l = Laser()
+    l.connect(serial_mock) # The mock's fileno() doesn't return a usable file descriptor
+    assert l._fd is None
+    assert l._chunked_reads
+
+    serial_mock.in_waiting = 4
+    serial_mock.read.side_effect = [b"ok\r\n"]
+    assert l._send_command("EN 1") == b"ok\r\n"
+    serial_mock.read.assert_called_once_with(4)
+    serial_mock.read_until.assert_not_called()
+
+    serial_mock.in_waiting = 0
+    serial_mock.read.side_effect = [b"1", b""] # Nothing else arrives before the timeout
+    assert l._send_command("EN?") == b"1"
+
+def test_refresh_parameters(laser_factory):
+    """Tests Laser.refresh_parameters, all six queries should go out in a single write and each response should be parsed into the matching property."""
+    l, serial_mock = laser_factory(side_effect=[b"2\r\n", b"0.5\r\n", b"2.0\r\n", b"20\r\n", b"0.0002\r\n", b"1\r\n"])
+
+    l.refresh_parameters()
+    serial_mock.write.assert_called_once_with(_REFRESH_QUERIES)
+    assert serial_mock.read_until.call_count == 6
+    assert l.pulseMode == 2
+    assert l.pulsePeriod == 0.5
+    assert l.repRate == 2.0
+    assert l.burstCount == 20
+    assert l.pulseWidth == 0.0002
+    assert l.diodeTrigger == 1
+
+    serial_mock.read_until.side_effect = [b"2\r\n", b"?1\r\n", b"2.0\r\n", b"20\r\n", b"0.0002\r\n", b"1\r\n"]
+    with pytest.raises(LaserCommandError):
+        l.refresh_parameters()
+
+def test_arm_command(laser_factory):
+    """Tests Laser.arm(), should return True because we are feeding it a nominal response, and this should result in serial.write being called with the correct command"""
+    l, serial_mock = laser_factory(b"ok\r\n") # NOTE: Major difference from pyserial class, write does not return the number of bytes written.
+
+    # Now check the arm command
+    assert l.arm() == True
+
+    serial_mock.write.assert_any_call(_EN_QUERY)
+    serial_mock.write.assert_any_call(_EN_1)
+
+def test_is_armed(laser_factory):
+    """Tests Laser.is_armed(), the laser answers EN? with 1 when armed and 0 when not."""
+    l, serial_mock = laser_factory(b"1\r\n")
+
+    assert l.is_armed(force=True) == True
+    serial_mock.write.assert_called_once_with(_EN_QUERY)
+
+    serial_mock.read_until.return_value = b"0\r\n"
+    assert l.is_armed(force=True) == False
+
+    serial_mock.read_until.return_value = b"?8\r\n"
+    with pytest.raises(LaserCommandError):
+        l.is_armed(force=True)
+
+def test_disarm_command(laser_factory):
+    """Tests Laser.disarm(), should return True because we are feeding it a nominal response, and this should result in serial.write being called with the correct command"""
+    l, serial_mock = laser_factory(b"ok\r\n") # NOTE: Major difference from pyserial class, write does not return the number of bytes written.
+
+    # Now check the disarm command
+    assert l.disarm() == True
+    serial_mock.write.assert_called_once_with(_EN_0)
+
+def test_emergency_stop(laser_factory):
+    """Tests Laser.emergency_stop(), it should normally send FL 0 and check the response, but still get FL 0 out if another thread is holding the serial line."""
+    l, serial_mock = laser_factory(b"ok\r\n")
+
+    l._start_kicker()
+    assert l.emergency_stop() == True
+    assert l.emergencyStopActive
+    assert l._kicker_stop.is_set()
+    l._kicker_thread.join(timeout=1)
+    assert not l._kicker_thread.is_alive()
+    # Sent straight away, then again to check the response
+    assert serial_mock.write.call_args_list == [((_FL_0,),)] * 2
+
+    # Hold the serial line from another thread, like a read that is stuck waiting on the laser
+    held = threading.Event()
+    release = threading.Event()
+    def hold_line():
+        with l._lock:
+            held.set()
+            release.wait()
+    holder = threading.Thread(target=hold_line)
+    holder.start()
+    held.wait()
+
+    serial_mock.write.reset_mock()
+    serial_mock.read_until.reset_mock()
+    try:
+        assert l.emergency_stop() == False # Sent, but the response could not be checked
+    finally:
+        release.set()
+        holder.join()
+    serial_mock.write.assert_called_once_with(_FL_0)
+    serial_mock.read_until.assert_not_called()
+
+def test_send_command_thread_safe(laser_factory):
+    """Commands sent from several threads at once must not interleave, each write has to be followed by its own read."""
+    l, serial_mock = laser_factory()
+    calls = []
+    def write(frame):
+        calls.append("write")
+    def slow_read_until(*args):
+        time.sleep(0.001) # waiting on the laser, gives the other threads a chance to cut in
+        calls.append("read")
+        return b"3075\r\n"
+    serial_mock.write.side_effect = write
+    serial_mock.read_until.side_effect = slow_read_until
+
+    start = threading.Barrier(4)
+    def poll_status():
+        start.wait() # all threads send at the same time
+        l.get_status(force=True)
+    threads = [threading.Thread(target=poll_status) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ["write", "read"] * 4
+
+def test_kicker(laser_factory):
+    """The kicker thread should only be started when needed, and should stop itself once the laser is done firing."""
+    l, serial_mock = laser_factory(b"3073\r\n") # Enabled, but no longer active
+    assert l._kicker_thread is None # Nothing should be running until the laser fires
+
+    l._kicker_interval = 0.01
+    l.fire_duration = 0.02
+
+    l._start_kicker()
+    l._kicker_thread.join(timeout=1)
+    assert not l._kicker_thread.is_alive()
+    assert l._fire_timer == 0
+    serial_mock.write.assert_any_call(_SS_QUERY)
+
+    # An error while checking the status should stop the laser firing
+    serial_mock.read_until.return_value = b"?1\r\n"
+    serial_mock.write.reset_mock()
+
+    l._start_kicker()
+    l._kicker_thread.join(timeout=1)
+    assert not l._kicker_thread.is_alive()
+    serial_mock.write.assert_any_call(_FL_0)
+
+    # So should a reply that isn't a status at all, like the ok from an emergency stop written in the middle of the read
+    serial_mock.read_until.return_value = b"ok\r\n"
+    serial_mock.write.reset_mock()
+    l._kicker_stop.clear()
+
+    l._kicker_callback(l)
+    assert l._kicker_stop.is_set()
+    serial_mock.write.assert_called_with(_FL_0)
+
+def test_kicker_restart(laser_factory):
+    """Restarting the kicker while the old thread has been told to stop, but hasn't exited yet, must still leave a kicker running."""
+    entered = threading.Event()
+    release = threading.Event()
+    def slow_read(*args):
+        entered.set()
+        release.wait(1)
+        return b"3075\r\n" # Still firing
+    l, serial_mock = laser_factory(side_effect=slow_read)
+    l._kicker_interval = 0.01
+    l.fire_duration = 10
+
+    l._start_kicker()
+    old_thread = l._kicker_thread
+    assert entered.wait(1) # The old thread is in the middle of a status check
+    l._kicker_stop.set() # e.g. emergency_stop()
+    threading.Timer(0.05, release.set).start()
+
+    l._start_kicker() # The next fire()
+    try:
+        assert not old_thread.is_alive()
+        assert l._kicker_thread is not old_thread
+        assert l._kicker_thread.is_alive()
+        assert not l._kicker_stop.is_set()
+    finally:
+        l._kicker_stop.set()
+        l._kicker_thread.join(timeout=1)
+
+def test_kicker_poll(laser_factory):
+    """With use_kicker_thread turned off no thread should be started, and the kicker should run from poll() instead."""
+    l, serial_mock = laser_factory(b"3073\r\n") # Enabled, but no longer active
+    l.use_kicker_thread = False
+    l._kicker_interval = 0.01
+    l.fire_duration = 0.005
+
+    assert l.poll() == False # Nothing to do before firing
+    l._start_kicker()
+    assert l._kicker_thread is None
+    assert l.poll() == True # Not due yet
+    serial_mock.write.assert_not_called()
+
+    for _ in range(100):
+        time.sleep(l._kicker_interval)
+        if not l.poll():
+            break
+    assert l.poll() == False
+    serial_mock.write.assert_any_call(_SS_QUERY)
+
+def test_status_class():
+    """Tests to make sure the LaserStatusResponse class parses response strings correctly."""
+    s = LaserStatusResponse(b'3075\r') # This example is pulled from the user manual
+    assert s.ready_to_enable
+    assert s.ready_to_fire
+    assert s.laser_enabled
+    assert s.laser_active
+    assert not s.high_power_mode
+    assert not s.low_power_mode
+    assert not s.resonator_over_temp
+    assert not s.electrical_over_temp
+    assert not s.external_interlock
+    assert int(s) == 3075
+    assert str(s) == "Laser is enabled\nExternal Interlock is: CONNECTED\nReady to fire: True\nReady to enable: True\nLaser is in MANUAL power mode.\nLaser is ACTIVE.\n"
+    assert "!!!POWER FAILURE              !!!\n" in str(LaserStatusResponse(b'512\r\n'))
+    assert int(LaserStatusResponse(b'3075\r\n\x00')) == 3075
+    assert int(LaserStatusResponse('3075\r\n\x00')) == 3075 # str is still accepted
+    assert not hasattr(s, "__dict__") # only the int is stored, this gets created on every status poll
+
+def test_status_bits():
+    """Each status bit should only set its own flag."""
+    names = [name for name, mask in LaserStatusResponse._BITS]
+    for name, mask in LaserStatusResponse._BITS:
+        s = LaserStatusResponse(str(mask).encode("ascii") + b"\r\n")
+        assert int(s) == mask
+        assert [getattr(s, n) for n in names] == [n == name for n in names]
+
+def test_get_status(laser_factory):
+    """Tests to make sure that the get_status() function operates properly."""
+    l, serial_mock = laser_factory(side_effect=[b"?1\r", b"3075\r"]) # An error first, then a nominal response
+
+    with pytest.raises(LaserCommandError):
+        l.get_status()
+
+    serial_mock.write.assert_called_once_with(_SS_QUERY)
+    serial_mock.write.reset_mock()
+
+    status = l.get_status()
+
+    serial_mock.write.assert_called_once_with(_SS_QUERY)
+
+    assert status.laser_active
+    assert status.laser_enabled
+    assert status.ready_to_fire
+    assert status.ready_to_enable
+    assert not status.diode_external_trigger
+    assert not status.high_power_mode
+    assert not status.low_power_mode
+    assert not status.resonator_over_temp
+    assert not status.electrical_over_temp
+    assert not status.external_interlock
+
+def test_get_status_burst():
+    """get_status_burst() should write all of its queries at once, then parse one response for each of them."""
+    async def run():
         l = Laser()
-        l._ser = serial_mock
-        l.connected = True
-        
-        minimum, maximum = l.get_repetition_rate_range()
-        assert minimum == test_range[0]
-        assert maximum == test_range[1]
-        serial_mock.write.assert_any_call(";LA:RR:MIN?\r".encode("ascii"))
-        serial_mock.write.assert_any_call(";LA:RR:MAX?\r".encode("ascii"))
-
-    def test_pulse_width_command(self):
-        """Tests Laser.set_pulse_width, feeds in a mock serial object. Makes sure that the correct data is written and that the properties of the class are changed."""
-        serial_mock = Mock()
-
-        serial_mock.read_until = Mock(return_value=b"ok\r\n")
-        serial_mock.write = Mock()
-
-        l = Laser()
-        l._ser = serial_mock
-        l.connected = True
-
-        with self.assertRaises(ValueError):
-            l.set_pulse_width(0) # Valid values positive, non-zero numbers
-
-        with self.assertRaises(ValueError):
-            l.set_pulse_width(-20) # Valid values positive numbers
-
-        with self.assertRaises(ValueError):
-            l.set_pulse_width("this is not an integer")
-
-        assert l.set_pulse_width(0.1)
-        serial_mock.write.assert_called_once_with(";LA:DW 0.1\r".encode("ascii"))
-        assert l.pulseWidth == 0.1
-
-        serial_mock.read_until = Mock(return_value=b"?1") # Make sure we return False is the laser returns an error
-        serial_mock.write = Mock()
-
-        with self.assertRaises(LaserCommandError):
-            l.set_pulse_width(0.2)
-
-        serial_mock.write.assert_called_once_with(";LA:DW 0.2\r".encode("ascii"))
-        assert l.pulseWidth == 0.1 # This value should have NOT changed since this command failed.
-
-if __name__ == "__main__":
-    unittest.main()
+        with pytest.raises(ConnectionError):
+            await l.get_status_async()
+
+        # Stand-ins for the streams connect_async() would open
+        l._reader = asyncio.StreamReader()
+        l._writer = Mock(spec_set=asyncio.StreamWriter)
+        l._writer.drain = AsyncMock()
+        l._async_lock = asyncio.Lock()
+        l._async_timeout = 0.05
+
+        l._reader.feed_data(b"3075\r\n1024\r\n3073\r\n")
+        statuses = await l.get_status_burst(3)
+        l._writer.write.assert_called_once_with(_SS_QUERY * 3)
+        assert [int(s) for s in statuses] == [3075, 1024, 3073]
+
+        l._reader.feed_data(b"3075\r\n")
+        assert int(await l.get_status_async()) == 3075
+
+        l._reader.feed_data(b"?1\r\n")
+        with pytest.raises(LaserCommandError):
+            await l.get_status_async()
+        reader, writer = l._reader, l._writer
+        with pytest.raises(LaserCommandError): # Nothing arrives before the timeout
+            await l.get_status_async()
+
+        # The late reply to the query that timed out must not be taken as the answer to the next one
+        reader.feed_data(b"3075\r\n")
+        writer.close.assert_called_once_with()
+        assert l._reader is None and l._writer is None
+        with pytest.raises(ConnectionError):
+            await l.get_status_async()
+    asyncio.run(run())
+
+def test_connect_async_requires_pyserial_asyncio():
+    """connect_async() should say what is missing when pyserial-asyncio isn't installed."""
+    with patch.object(lasercontrol, "serial_asyncio", None):
+        with pytest.raises(ImportError):
+            asyncio.run(Laser().connect_async("/dev/ttyUSB0"))
+
+def test_query_cache(laser_factory):
+    """Read-only queries repeated within their TTL should be answered without another round-trip, unless forced or another command was sent in between."""
+    l, serial_mock = laser_factory(b"3075\r\n")
+
+    assert int(l.get_status()) == 3075
+    assert int(l.get_status()) == 3075
+    serial_mock.write.assert_called_once_with(_SS_QUERY)
+
+    l.get_status(force=True)
+    assert serial_mock.write.call_count == 2
+
+    serial_mock.read_until.return_value = b"ok\r\n"
+    l.disarm() # Anything that isn't a query should drop cached answers
+    serial_mock.read_until.return_value = b"1024\r\n"
+    assert int(l.get_status()) == 1024
+    assert serial_mock.write.call_count == 4
+
+    serial_mock.read_until.return_value = b"25.5\r\n"
+    assert l.get_fet_temp() == 25.5
+    serial_mock.read_until.return_value = b"30.0\r\n"
+    assert l.get_fet_temp() == 25.5
+    assert l.get_fet_temp(force=True) == 30.0
+
+    # A command from another thread clears the cache while EN? is waiting on its reply, that reply may be outdated already
+    def read_during_arm(*args):
+        l._cache_clear() # what arm() on another thread does
+        return b"0\r\n"
+    serial_mock.read_until.side_effect = read_during_arm
+    assert l.is_armed() == False
+    serial_mock.read_until.side_effect = None
+    serial_mock.read_until.return_value = b"1\r\n"
+    assert l.is_armed() == True # asked again instead of answering from the cache
+
+def test_get_laser_ID(laser_factory):
+    """Laser.get_laser_ID should return the ID string without the terminator, and numeric getters should parse the raw response."""
+    l, serial_mock = laser_factory(b"QC,MicroJewel,00101,1.0-0.0.0.8\r\n")
+
+    assert l.get_laser_ID() == "QC,MicroJewel,00101,1.0-0.0.0.8"
+    serial_mock.write.assert_called_once_with(_ID_QUERY)
+
+    serial_mock.read_until.return_value = b"123456\r\n"
+    assert l.get_system_shot_count() == 123456
+
+def test_query_getters(laser_factory):
+    """The generated query getters should send their query, parse the response, and raise on an error response."""
+    l, serial_mock = laser_factory(b"2\r\n")
+
+    assert l.get_pulse_mode() == 2
+    serial_mock.write.assert_called_once_with(_PM_QUERY)
+
+    serial_mock.read_until.return_value = b"0.5\r\n"
+    assert l.get_pulse_period() == 0.5
+    serial_mock.write.assert_called_with(_PE_QUERY)
+
+    serial_mock.read_until.return_value = b"?1\r\n"
+    with pytest.raises(LaserCommandError):
+        l.get_burst_count()
+    serial_mock.read_until.return_value = b""
+    with pytest.raises(LaserCommandError):
+        l.get_repetition_rate()
+
+    assert Laser.get_burst_count.__name__ == "get_burst_count"
+    assert "Returns\n" in Laser.get_burst_count.__doc__ # Same numpydoc layout as the hand-written getters
+    assert "burst_count : int" in Laser.get_burst_count.__doc__
+
+def test_diode_trigger_command(laser_factory):
+    """Tests Laser.set_diode_trigger, feeds in a mock serial object. Makes sure that the correct data is written and that the properties of the class are changed."""
+    l, serial_mock = laser_factory(side_effect=[b"ok\r\n", b"?1\r\n"]) # The second command gets an error, make sure we raise on it
+
+    with pytest.raises(ValueError):
+        l.set_diode_trigger(6)
+
+    with pytest.raises(ValueError):
+        l.set_diode_trigger("this is not an integer")
+
+    with pytest.raises(ValueError):
+        l.set_diode_trigger(1.5) # Floats should not be silently truncated
+
+    with pytest.raises(ValueError):
+        l.set_diode_trigger(True) # Neither should bools be taken as 0 or 1
+
+    assert l.set_diode_trigger(1)
+    serial_mock.write.assert_called_once_with(_DT_1)
+    assert l.diodeTrigger == 1
+
+    serial_mock.write.reset_mock()
+
+    with pytest.raises(LaserCommandError):
+        l.set_diode_trigger(0)
+
+    serial_mock.write.assert_called_once_with(_DT_0)
+    assert serial_mock.read_until.call_count == 2 # Invalid values must not be sent at all
+    assert l.diodeTrigger == 1 # This value should have NOT changed since this command failed.
+
+@pytest.mark.parametrize("method, frame, test_range", [
+    ("get_pulse_period_range", _PE_RANGE_QUERY, (0.00002, 0.002)),
+    ("get_repetition_rate_range", _RR_RANGE_QUERY, (1.0, 5.0)),
+])
+def test_get_range(laser_factory, method, frame, test_range):
+    """Tests Laser.get_pulse_period_range and Laser.get_repetition_rate_range"""
+    l, serial_mock = laser_factory(side_effect=[str(test_range[0]).encode("ascii"), str(test_range[1]).encode("ascii")])
+
+    minimum, maximum = getattr(l, method)()
+    assert minimum == test_range[0]
+    assert maximum == test_range[1]
+    serial_mock.write.assert_called_once_with(frame) # both queries in one round-trip
+    assert (minimum, maximum) == getattr(l, method)()
+    serial_mock.write.assert_called_once() # the range doesn't change, so it is only queried once
+
+def test_pulse_width_command(laser_factory):
+    """Tests Laser.set_pulse_width, feeds in a mock serial object. Makes sure that the correct data is written and that the properties of the class are changed."""
+    l, serial_mock = laser_factory(side_effect=[b"ok\r\n", b"?1"]) # The second command gets an error, make sure we raise on it
+
+    with pytest.raises(ValueError):
+        l.set_pulse_width(0) # Valid values positive, non-zero numbers
+
+    with pytest.raises(ValueError):
+        l.set_pulse_width(-20) # Valid values positive numbers
+
+    with pytest.raises(ValueError):
+        l.set_pulse_width("this is not an integer")
+
+    with pytest.raises(ValueError):
+        l.set_pulse_width("0.1") # Numeric strings are not converted either
+
+    with pytest.raises(ValueError):
+        l.set_pulse_width(True)
+
+    assert l.set_pulse_width(0.1)
+    serial_mock.write.assert_called_once_with(_DW_0_1)
+    assert l.pulseWidth == 0.1
+
+    serial_mock.write.reset_mock()
+
+    with pytest.raises(LaserCommandError):
+        l.set_pulse_width(0.2)
+
+    serial_mock.write.assert_called_once_with(_DW_0_2)
+    assert serial_mock.read_until.call_count == 2 # Invalid values must not be sent at all
+    assert l.pulseWidth == 0.1 # This value should have NOT changed since this command failed.
+
+def test_repetition_rate_and_diode_current_commands(laser_factory):
+    """Tests Laser.set_repetition_rate and Laser.set_diode_current. Integers must go over the line as they were given, without a trailing .0"""
+    l, serial_mock = laser_factory(b"ok\r\n")
+
+    for bad in (0, 6, "2", True):
+        with pytest.raises(ValueError):
+            l.set_repetition_rate(bad)
+    for bad in (0, -1, "5", True):
+        with pytest.raises(ValueError):
+            l.set_diode_current(bad)
+    serial_mock.write.assert_not_called()
+
+    assert l.set_repetition_rate(2)
+    serial_mock.write.assert_called_once_with(_RR_2)
+    assert l.repRate == 2 and type(l.repRate) == int
+    serial_mock.write.reset_mock()
+    assert l.set_repetition_rate(2.5)
+    serial_mock.write.assert_called_once_with(_RR_2_5)
+    assert l.repRate == 2.5
+
+    serial_mock.write.reset_mock()
+    assert l.set_diode_current(5)
+    serial_mock.write.assert_called_once_with(_DC_5)
+    assert l.diodeCurrent == 5 and type(l.diodeCurrent) == int
+    serial_mock.write.reset_mock()
+    assert l.set_diode_current(5.5)
+    serial_mock.write.assert_called_once_with(_DC_5_5)